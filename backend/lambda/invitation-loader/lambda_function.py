@@ -0,0 +1,227 @@
+import argparse
+import boto3
+import csv
+import json
+import os
+import random
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from botocore.config import Config
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# ========= CONFIG =========
+INVITATIONS_TABLE = os.environ.get("INVITATIONS_TABLE", "invitations")
+WRITE_WORKERS = int(os.environ.get("WRITE_WORKERS", "8"))
+BATCH_GET_SIZE = 100   # DynamoDB BatchGetItem limit
+BATCH_WRITE_SIZE = 25  # DynamoDB BatchWriteItem limit
+MAX_RETRIES = 8
+SKIP_STATUSES = {"pending", "accepted"}
+SUPPORTED_TYPES = (".csv", ".xlsx")
+EMAIL_PATTERN = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+# ==========================
+
+# Low-level clients are thread-safe, so one is shared by all write workers
+dynamodb = boto3.client(
+    "dynamodb",
+    config=Config(
+        region_name="us-east-2",
+        max_pool_connections=WRITE_WORKERS * 2,
+        retries={"max_attempts": 5, "mode": "adaptive"},
+    ),
+)
+s3 = boto3.client("s3")
+
+
+# =========================
+# 📂 READ + NORMALIZE
+# =========================
+
+def iter_cells(path):
+    """Every non-blank cell of a CSV or of every sheet of a workbook, as text."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        # csv.reader keeps ragged rows (notes in extra columns) instead of rejecting them
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            for row in csv.reader(f):
+                yield from (cell for cell in row if cell.strip())
+    elif ext == ".xlsx":
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for ws in wb.worksheets:
+                # Read-only sheets trust the stored <dimension>, which may be stale
+                ws.reset_dimensions()
+                for row in ws.iter_rows(values_only=True):
+                    yield from (str(cell) for cell in row if cell is not None and str(cell).strip())
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Unsupported file type '{ext}' — expected .csv or .xlsx")
+
+
+def read_emails(path):
+    """
+    Returns the unique email addresses found anywhere in a CSV or every sheet
+    of a workbook, plus the number of non-blank cells looked at. Addresses
+    are trimmed but keep their case: the auth triggers look invitations up by
+    the email exactly as Cognito has it. Header rows and stray notes fall out
+    because they don't look like emails.
+    """
+    emails, cells = {}, 0
+    for cell in iter_cells(path):
+        cells += 1
+        email = cell.strip()
+        if EMAIL_PATTERN.fullmatch(email):
+            emails[email] = None
+    return list(emails), cells
+
+
+# =========================
+# 🗄 DYNAMODB
+# =========================
+
+def chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def backoff(attempt):
+    time.sleep(min(0.05 * 2 ** attempt, 2) * random.uniform(0.5, 1))
+
+
+def existing_invitations(emails):
+    """{email: status} for emails that already have an invitation."""
+    statuses = {}
+    for batch in chunks(emails, BATCH_GET_SIZE):
+        request = {
+            INVITATIONS_TABLE: {
+                "Keys": [{"email": {"S": email}} for email in batch],
+                "ProjectionExpression": "email, #s",
+                "ExpressionAttributeNames": {"#s": "status"},
+            }
+        }
+        attempt = 0
+        while request:
+            result = dynamodb.batch_get_item(RequestItems=request)
+            for item in result["Responses"].get(INVITATIONS_TABLE, []):
+                statuses[item["email"]["S"]] = item.get("status", {}).get("S")
+
+            request = result.get("UnprocessedKeys") or None
+            if request:
+                if attempt == MAX_RETRIES:
+                    raise RuntimeError(f"Gave up reading {len(request[INVITATIONS_TABLE]['Keys'])} invitations")
+                backoff(attempt)
+                attempt += 1
+    return statuses
+
+
+def write_batch(emails, created_at):
+    request = {
+        INVITATIONS_TABLE: [
+            {"PutRequest": {"Item": {
+                "email": {"S": email},
+                "status": {"S": "pending"},
+                "created_at": {"N": str(created_at)},
+            }}}
+            for email in emails
+        ]
+    }
+    attempt = 0
+    while request:
+        result = dynamodb.batch_write_item(RequestItems=request)
+        request = result.get("UnprocessedItems") or None
+        if request:
+            if attempt == MAX_RETRIES:
+                raise RuntimeError(f"Gave up writing {len(request[INVITATIONS_TABLE])} invitations")
+            backoff(attempt)
+            attempt += 1
+    return len(emails)
+
+
+def write_invitations(emails):
+    created_at = int(time.time() * 1000)
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as pool:
+        return sum(pool.map(
+            lambda batch: write_batch(batch, created_at),
+            chunks(emails, BATCH_WRITE_SIZE),
+        ))
+
+
+# =========================
+# 🔄 CORE PROCESSING
+# =========================
+
+def process(path):
+    started = time.perf_counter()
+
+    emails, cells = read_emails(path)
+    print(f"Found {len(emails)} unique emails in {cells} cells")
+
+    statuses = existing_invitations(emails)
+    new_emails = [e for e in emails if statuses.get(e) not in SKIP_STATUSES]
+    skipped = len(emails) - len(new_emails)
+    print(f"  {skipped} already pending or accepted — skipping")
+
+    written = write_invitations(new_emails)
+
+    elapsed = time.perf_counter() - started
+    report = {
+        "unique": len(emails),
+        "skipped": skipped,
+        "written": written,
+        "seconds": round(elapsed, 2),
+        "emails_per_second": round(len(emails) / elapsed, 1) if elapsed else None,
+    }
+    print(f"Done. Wrote {written} invitations in {report['seconds']}s "
+          f"({report['emails_per_second']} emails/s)")
+    return report
+
+
+# =========================
+# 🚀 LAMBDA HANDLER
+# =========================
+
+def handler(event, context):
+    reports, rejected = [], []
+    for record in event.get("Records", []):
+        source_bucket = record["s3"]["bucket"]["name"]
+        # S3 event keys are URL-encoded (spaces arrive as '+')
+        source_key = unquote_plus(record["s3"]["object"]["key"])
+
+        print(f"Triggered by s3://{source_bucket}/{source_key}")
+
+        # Rejections are logged, not raised: S3 would retry the invocation
+        # on the same bad file
+        ext = os.path.splitext(source_key)[1].lower()
+        if ext not in SUPPORTED_TYPES:
+            rejected.append({"file": source_key, "code": "unsupported_file_type",
+                             "message": "Expected a .csv or .xlsx email list"})
+            print(json.dumps({"rejected": rejected[-1]}))
+            continue
+
+        local_path = os.path.join("/tmp", os.path.basename(source_key))
+        try:
+            s3.download_file(source_bucket, source_key, local_path)
+            reports.append(process(local_path))
+        except (zipfile.BadZipFile, InvalidFileException, UnicodeDecodeError) as e:
+            rejected.append({"file": source_key, "code": "unreadable_file", "message": str(e)})
+            print(json.dumps({"rejected": rejected[-1]}))
+        finally:
+            # Always clean up /tmp — Lambda reuses execution environments
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+    if rejected:
+        return {"statusCode": 422, "body": {"loaded": reports, "rejected": rejected}}
+    return {"statusCode": 200, "body": reports}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-load pending invitations from CSV/xlsx email lists.")
+    parser.add_argument("files", nargs="+", help="CSV or xlsx files containing email addresses")
+    for path in parser.parse_args().files:
+        print(f"\nLoading {path}")
+        process(path)
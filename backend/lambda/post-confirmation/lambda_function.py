@@ -1,29 +1,90 @@
 import boto3
+import json
 import time
+from botocore.config import Config
+from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-2')
-users_table = dynamodb.Table('users')
-invitations_table = dynamodb.Table('invitations')
+# Cognito gives triggers 5s in total. Two attempts of at most 1s connect +
+# 1s read keep the worst case around 4s. The client is created once per
+# execution environment, so warm invocations reuse its pooled HTTPS
+# connection; tcp_keepalive only stops that idle socket being dropped.
+config = Config(
+    region_name='us-east-2',
+    tcp_keepalive=True,
+    connect_timeout=1,
+    read_timeout=1,
+    retries={'max_attempts': 2, 'mode': 'adaptive'},
+)
+
+dynamodb = boto3.client('dynamodb', config=config)
+
+
+def emit_metrics(trigger_source, latency_ms, outcome):
+    """CloudWatch Embedded Metric Format — picked up from the log line, no extra API call."""
+    print(json.dumps({
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': 'prjmanager/auth',
+                'Dimensions': [['Trigger']],
+                'Metrics': [{'Name': 'LatencyMs', 'Unit': 'Milliseconds'}],
+            }],
+        },
+        'Trigger': 'post-confirmation',
+        'TriggerSource': trigger_source,
+        'Outcome': outcome,
+        'LatencyMs': latency_ms,
+    }))
 
 
 def handler(event, context):
+    started = time.perf_counter()
     attrs = event['request']['userAttributes']
     sub = attrs['sub']
     email = attrs['email']
     name = attrs.get('name') or email
 
-    users_table.put_item(Item={
-        'id': sub,
-        'email': email,
-        'name': name,
-        'created_at': int(time.time() * 1000),
-    })
-
-    invitations_table.update_item(
-        Key={'email': email},
-        UpdateExpression='SET #s = :accepted',
-        ExpressionAttributeNames={'#s': 'status'},
-        ExpressionAttributeValues={':accepted': 'accepted'},
-    )
+    # One round-trip; the user row and the accepted invitation land together
+    # or not at all. The condition makes a retried or repeated confirmation
+    # (e.g. forgot-password) a no-op instead of overwriting created_at.
+    outcome = 'error'
+    try:
+        dynamodb.transact_write_items(TransactItems=[
+            {
+                'Put': {
+                    'TableName': 'users',
+                    'Item': {
+                        'id': {'S': sub},
+                        'email': {'S': email},
+                        'name': {'S': name},
+                        'created_at': {'N': str(int(time.time() * 1000))},
+                    },
+                    'ConditionExpression': 'attribute_not_exists(id)',
+                },
+            },
+            {
+                'Update': {
+                    'TableName': 'invitations',
+                    'Key': {'email': {'S': email}},
+                    'UpdateExpression': 'SET #s = :accepted',
+                    'ExpressionAttributeNames': {'#s': 'status'},
+                    'ExpressionAttributeValues': {':accepted': {'S': 'accepted'}},
+                },
+            },
+        ])
+        outcome = 'created'
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'TransactionCanceledException':
+            raise
+        reasons = e.response.get('CancellationReasons', [])
+        if not any(r.get('Code') == 'ConditionalCheckFailed' for r in reasons):
+            raise
+        outcome = 'already_confirmed'
+    finally:
+        emit_metrics(
+            event.get('triggerSource'),
+            round((time.perf_counter() - started) * 1000, 1),
+            outcome,
+        )
 
     return event
@@ -1,22 +1,85 @@
 import boto3
+import difflib
+import hashlib
+import itertools
+import json
 import os
 import re
+import sys
+import threading
+import time
 import zipfile
+import zlib
 import shutil
 import xml.etree.ElementTree as ET
-import pandas as pd
-from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+from boto3.dynamodb.conditions import Attr, Key
+from openpyxl import load_workbook
+
+from product_schema import (
+    CLAIMED_BY_FIELD,
+    HASH_FIELD,
+    HEADER_LOOKUP,
+    IGNORED_HEADERS,
+    PRODUCT_SCHEMA,
+    REQUIRED_COLUMNS,
+    REVISION_FIELD,
+    SCHEMA_COLUMNS,
+    SKU_COLUMN,
+    SKU_POSITION,
+    SOURCE_FIELD,
+    SUMMARY_SORT_KEY,
+    compile_columns,
+    index_attributes,
+    is_blank,
+    normalize_header,
+    read_sheet,
+    summary_items,
+)
 
 # ========= CONFIG =========
-SKU_COLUMN = "sku"
 PRODUCTS_TABLE = os.environ.get("PRODUCTS_TABLE", "products")
 PRODUCT_IMAGE_BUCKET = os.environ.get("PRODUCT_IMAGE_BUCKET")
+PRODUCT_SUMMARIES_TABLE = os.environ.get("PRODUCT_SUMMARIES_TABLE")
 IMAGES_PREFIX = "product-images"
+# Unknown columns are dropped unless this is set, in which case they are
+# kept under PASSTHROUGH_FIELD as {normalized header: value}
+PASSTHROUGH_UNKNOWN_COLUMNS = os.environ.get("PASSTHROUGH_UNKNOWN_COLUMNS", "").lower() in ("1", "true", "yes")
+PASSTHROUGH_FIELD = "extra"
+# Each workbook is a "source" (its S3 prefix, e.g. vendors/ikea/, or its file
+# name at the bucket root) and an upload only rewrites and prunes that
+# source's SKUs. Every source's own version of each SKU it lists is kept in
+# CLAIMS_TABLE (partition key source, sort key sku); the products item is
+# the best-ranked claim.
+CLAIM_PRODUCT_FIELD = "product"
+CLAIMS_TABLE = os.environ.get("PRODUCT_CLAIMS_TABLE", "product-claims")
+# When two sources list the same SKU, the one earlier in this comma-separated
+# list wins; unlisted sources rank after listed ones, alphabetically.
+SOURCE_PRIORITY = [p.strip() for p in os.environ.get("SOURCE_PRIORITY", "").split(",") if p.strip()]
+WRITE_WORKERS = int(os.environ.get("WRITE_WORKERS", "8"))
+WRITE_CHUNK_SIZE = 100
+MAX_WRITE_ATTEMPTS = 5
+# Caps the row numbers listed per sheet in non_numeric_sku warnings
+MAX_REPORTED_ROWS = 20
 # ==========================
 
 s3 = boto3.client("s3")
 dynamodb = boto3.resource("dynamodb")
 table = dynamodb.Table(PRODUCTS_TABLE)
+claims_table = dynamodb.Table(CLAIMS_TABLE)
+
+# boto3 resources are not thread-safe, so each write worker gets its own
+_local = threading.local()
+
+
+def thread_tables():
+    if not hasattr(_local, "products"):
+        resource = boto3.session.Session().resource("dynamodb")
+        _local.products = resource.Table(PRODUCTS_TABLE)
+        _local.claims = resource.Table(CLAIMS_TABLE)
+        _local.summaries = resource.Table(PRODUCT_SUMMARIES_TABLE) if PRODUCT_SUMMARIES_TABLE else None
+    return _local
 
 
 # =========================
@@ -27,48 +90,117 @@ def slugify(text):
     return re.sub(r'[^a-zA-Z0-9_-]', '_', str(text))
 
 
-def clean_columns(df):
-    df.columns = [
-        col.strip()
-        .lower()
-        .replace(" ", "_")
-        .replace("#", "number")
-        .replace("sku_number", "sku")
-        for col in df.columns
-    ]
-    return df
+def source_for_key(key):
+    """'vendors/ikea/catalog.xlsx' → 'vendors/ikea', 'MasterProductList.xlsx' → 'MasterProductList'."""
+    prefix, filename = os.path.split(key)
+    return prefix or os.path.splitext(filename)[0]
 
 
-def clean_value(val, key=None):
-    """
-    Normalize a cell value to a Python/DynamoDB-safe type.
-    - numpy scalars → Python natives
-    - NaN / NaT → None  (filtered out before DynamoDB write)
-    - Timestamps → ISO string
-    - Non-integer floats → Decimal  (DynamoDB rejects float)
-    - Float/int that is a whole number → int
-    """
-    if pd.isna(val):
-        return None
+def source_rank(source):
+    """Lower wins. Items written before sources existed have no owner and always lose."""
+    if source is None:
+        return (len(SOURCE_PRIORITY) + 1, "")
+    if source in SOURCE_PRIORITY:
+        return (SOURCE_PRIORITY.index(source), "")
+    return (len(SOURCE_PRIORITY), source)
 
-    if isinstance(val, pd.Timestamp):
-        return val.isoformat()
 
-    # Convert numpy scalars (int64, float64, etc.) to Python natives
-    if hasattr(val, 'item'):
-        val = val.item()
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
 
-    if key == SKU_COLUMN:
-        if isinstance(val, (int, float)) and float(val).is_integer():
-            return int(val)
 
-    if isinstance(val, (int, float)) and float(val).is_integer():
-        return int(val)
+def content_hash(item, image_files=()):
+    """Covers the item and the bytes of its images, so a replaced picture counts as a change."""
+    payload = json.dumps([item, [file_digest(p) for p in image_files]],
+                         sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
 
-    if isinstance(val, float):
-        return Decimal(str(val))
 
-    return val
+def image_key(source, sku, position, ext):
+    """Per source, so two sources listing a SKU never overwrite each other's pictures."""
+    suffix = "" if position == 1 else f"_{position}"
+    return f"{IMAGES_PREFIX}/{slugify(source)}/{slugify(sku)}{suffix}{ext}"
+
+
+def image_url(s3_key):
+    return f"https://{PRODUCT_IMAGE_BUCKET}.s3.amazonaws.com/{s3_key}"
+
+
+# =========================
+# 🗜 RECORD STORE
+# =========================
+
+class ProductRow:
+    """
+    One SKU during ingestion. values is a tuple in SCHEMA_COLUMNS order,
+    sheets a bitset into RecordStore.sheet_names and images the extracted
+    local image files; images and extra stay None until needed. A few dozen bytes plus the tuple, instead of a dict with
+    two lists per SKU.
+    """
+    __slots__ = ("values", "sheets", "images", "extra")
+
+    def __init__(self, values, sheet_bit, extra):
+        self.values = values
+        self.sheets = sheet_bit
+        self.images = None
+        self.extra = extra
+
+
+class RecordStore:
+    """
+    Compact per-SKU rows for one workbook. Column names and sheet names are
+    held once here; rows only become dicts in products(), at write time.
+    """
+    __slots__ = ("source", "sheet_names", "rows")
+
+    def __init__(self, source):
+        self.source = source
+        self.sheet_names = []
+        self.rows = {}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add_sheet(self, sheet_name):
+        """Returns the sheet's bit for ProductRow.sheets."""
+        self.sheet_names.append(sys.intern(sheet_name))
+        return 1 << (len(self.sheet_names) - 1)
+
+    def add(self, sku, values, extra, sheet_bit):
+        """
+        First row for a SKU defines its fields; later rows only add their
+        sheet. Rows are keyed by the converted SKU (int when numeric).
+        """
+        row = self.rows.get(sku)
+        if row is None:
+            row = self.rows[sku] = ProductRow(values, sheet_bit, extra)
+        else:
+            row.sheets |= sheet_bit
+        return row
+
+    def product(self, row):
+        """
+        (item, uploads) where uploads pairs each local image file with the
+        S3 key the item's images URLs point at. Nothing is uploaded here.
+        """
+        item = {name: value for name, value in zip(SCHEMA_COLUMNS, row.values) if value is not None}
+        if row.extra:
+            item[PASSTHROUGH_FIELD] = row.extra
+        item["sheet_names"] = [
+            name for bit, name in enumerate(self.sheet_names) if row.sheets >> bit & 1
+        ]
+        sku = item[SKU_COLUMN]
+        uploads = [
+            (path, image_key(self.source, sku, position, os.path.splitext(path)[1].lower()))
+            for position, path in enumerate(row.images or (), start=1)
+        ]
+        item["images"] = [image_url(key) for _, key in uploads]
+        return item, uploads
+
+    def products(self):
+        for row in self.rows.values():
+            yield self.product(row)
 
 
 # =========================
@@ -178,6 +310,216 @@ def map_images_to_rows(temp_dir, sheet_index):
     return row_image_map
 
 
+# =========================
+# ✅ PRE-FLIGHT
+# =========================
+
+XLSX_NS = {
+    "m":   "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+    "r":   "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+    "rel": "http://schemas.openxmlformats.org/package/2006/relationships",
+}
+
+
+def column_index(cell_ref):
+    """'C1' → 2"""
+    idx = 0
+    for ch in cell_ref:
+        if not ch.isalpha():
+            break
+        idx = idx * 26 + ord(ch.upper()) - 64
+    return idx - 1
+
+
+def read_header_cells(zf, sheet_path):
+    """
+    Streams a sheet's XML only as far as the end of row 1. Returns
+    [(column index, cell type, raw text)]; shared-string cells hold the
+    string index as their text.
+    """
+    tag = lambda name: f"{{{XLSX_NS['m']}}}{name}"
+    cells = []
+    col = -1
+    with zf.open(sheet_path) as f:
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag == tag("c"):
+                text = "".join(t.text or "" for t in elem.iter(tag("t"))) \
+                    if elem.get("t") == "inlineStr" else elem.findtext(tag("v"))
+                # `r` is optional; without it a cell sits right after the previous one
+                ref = elem.get("r")
+                col = column_index(ref) if ref else col + 1
+                cells.append((col, elem.get("t"), text))
+            elif elem.tag == tag("row"):
+                if elem.get("r", "1") != "1":
+                    return []  # row 1 is empty, so is the header openpyxl will see
+                return cells
+            elif elem.tag == tag("sheetData"):
+                break
+    return []
+
+
+def read_shared_strings(zf, needed):
+    """Resolves only the shared-string indexes in `needed`, stopping at the highest one."""
+    path = "xl/sharedStrings.xml"
+    if not needed or path not in zf.namelist():
+        return {}
+
+    tag = f"{{{XLSX_NS['m']}}}si"
+    last = max(needed)
+    strings = {}
+    with zf.open(path) as f:
+        idx = 0
+        for _, elem in ET.iterparse(f, events=("end",)):
+            if elem.tag != tag:
+                continue
+            if idx in needed:
+                strings[idx] = "".join(t.text or "" for t in elem.iter(f"{{{XLSX_NS['m']}}}t"))
+            elem.clear()
+            if idx >= last:
+                break
+            idx += 1
+    return strings
+
+
+def near_misses(header_row, required):
+    """Unmapped headers that look like a mistyped or renamed required column, e.g. 'SKU No.' or 'skus'."""
+    candidates = {name: (name, *PRODUCT_SCHEMA[name]["aliases"]) for name in required}
+    found = []
+    for header in header_row:
+        if is_blank(header):
+            continue
+        normalized = normalize_header(header)
+        if normalized in HEADER_LOOKUP or normalized in IGNORED_HEADERS:
+            continue
+        for name, spellings in candidates.items():
+            if name in normalized or difflib.get_close_matches(normalized, spellings, n=1, cutoff=0.8):
+                found.append(str(header))
+                break
+    return found
+
+
+def preflight(excel_path, source_key):
+    """
+    Validates a workbook from its zip directory, workbook manifest and each
+    sheet's header row only — no unzip, no full parse. Returns a report
+    dict; report["ok"] is False when the workbook should be rejected.
+
+    A sheet without a required column is an error only when one of its
+    headers is a near miss for it (most likely a renamed header). Otherwise
+    it is a warning, since the pipeline skips it anyway (notes, lookups,
+    ...). Archives or XML that fail to parse are reported as
+    corrupt_workbook instead of raising.
+    """
+    started = time.perf_counter()
+    report = {"file": source_key, "ok": False, "errors": [], "warnings": [], "sheets": []}
+
+    def finish():
+        report["ok"] = not report["errors"]
+        report["seconds"] = round(time.perf_counter() - started, 3)
+        return report
+
+    if not source_key.lower().endswith(".xlsx"):
+        report["errors"].append({"code": "unsupported_file_type", "message": "Expected an .xlsx workbook"})
+        return finish()
+
+    if not zipfile.is_zipfile(excel_path):
+        report["errors"].append({"code": "not_a_zip", "message": "File is not a valid .xlsx (zip) archive"})
+        return finish()
+
+    try:
+        sheets, headers, strings = read_manifest(excel_path, report)
+        if sheets is None:
+            return finish()
+
+        product_sheets = 0
+        for name, _ in sheets:
+            if check_sheet(report, name, headers[name], strings):
+                product_sheets += 1
+    except (zipfile.BadZipFile, zlib.error, ET.ParseError, KeyError, ValueError) as e:
+        report["errors"].append({"code": "corrupt_workbook", "message": f"{type(e).__name__}: {e}"})
+        return finish()
+
+    if not product_sheets and not report["errors"]:
+        report["errors"].append({
+            "code": "no_product_sheets",
+            "message": f"No sheet has the required column(s) {REQUIRED_COLUMNS}",
+        })
+
+    return finish()
+
+
+def read_manifest(excel_path, report):
+    """
+    Returns (sheets, headers, strings) for preflight: [(name, path)], each
+    sheet's raw header cells and the shared strings they use. Returns
+    (None, None, None) after recording an error when the workbook has no
+    manifest or no sheets.
+    """
+    with zipfile.ZipFile(excel_path) as zf:
+        names = set(zf.namelist())
+        if "xl/workbook.xml" not in names or "xl/_rels/workbook.xml.rels" not in names:
+            report["errors"].append({"code": "missing_workbook", "message": "No xl/workbook.xml manifest"})
+            return None, None, None
+
+        targets = {
+            rel.get("Id"): rel.get("Target")
+            for rel in ET.parse(zf.open("xl/_rels/workbook.xml.rels")).getroot()
+        }
+
+        sheets = []
+        for sheet in ET.parse(zf.open("xl/workbook.xml")).getroot().iterfind("m:sheets/m:sheet", XLSX_NS):
+            target = targets.get(sheet.get(f"{{{XLSX_NS['r']}}}id"), "")
+            path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            sheets.append((sheet.get("name"), os.path.normpath(path).replace(os.sep, "/")))
+
+        if not sheets:
+            report["errors"].append({"code": "no_sheets", "message": "Workbook has no worksheets"})
+            return None, None, None
+
+        headers = {}
+        for name, path in sheets:
+            headers[name] = read_header_cells(zf, path) if path in names else []
+
+        needed = {int(text) for cells in headers.values() for _, kind, text in cells if kind == "s" and text}
+        return sheets, headers, read_shared_strings(zf, needed)
+
+
+def check_sheet(report, name, cells, strings):
+    """Adds one sheet's entry, errors and warnings to the report. True if the sheet will be ingested."""
+    header_row = [None] * (max((idx for idx, _, _ in cells), default=-1) + 1)
+    for idx, kind, text in cells:
+        header_row[idx] = strings.get(int(text)) if kind == "s" and text else text
+
+    columns, _, missing = compile_columns(header_row)
+    found = [SCHEMA_COLUMNS[pos] for _, pos, _ in columns]
+    unknown = [
+        normalize_header(h) for h in header_row
+        if not is_blank(h) and normalize_header(h) not in HEADER_LOOKUP
+        and normalize_header(h) not in IGNORED_HEADERS
+    ]
+    report["sheets"].append({"name": name, "columns": found, "unknown": unknown, "missing_required": missing})
+
+    if not missing:
+        return True
+
+    suspects = near_misses(header_row, missing)
+    if suspects:
+        report["errors"].append({
+            "code": "missing_required_column",
+            "sheet": name,
+            "message": f"Sheet has no {missing} column, but {suspects} looks like a renamed one",
+        })
+    elif found:
+        report["warnings"].append({
+            "code": "missing_required_column",
+            "sheet": name,
+            "message": f"Sheet has {found} but no {missing} column and will be skipped",
+        })
+    else:
+        report["warnings"].append({"code": "no_product_columns", "sheet": name, "message": "Sheet will be skipped"})
+    return False
+
+
 # =========================
 # 🔄 CORE PROCESSING
 # =========================
@@ -191,94 +533,270 @@ CONTENT_TYPES = {
 }
 
 
-def process(excel_path, temp_dir):
+def process(excel_path, temp_dir, source, report=None):
+    """
+    Ingests one workbook for `source`. Rows skipped because their SKU is not
+    numeric are added to report["warnings"] (when a report is given) as
+    non_numeric_sku, one entry per sheet.
+    """
     print("Unzipping workbook...")
     unzip_xlsx(excel_path, temp_dir)
 
-    sku_index = {}
-    xls = pd.ExcelFile(excel_path)
+    store = RecordStore(source)
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
 
-    for sheet_idx, sheet_name in enumerate(xls.sheet_names, start=1):
+    for sheet_idx, sheet_name in enumerate(wb.sheetnames, start=1):
         print(f"\nProcessing sheet: {sheet_name}")
 
-        df = pd.read_excel(excel_path, sheet_name=sheet_name)
-        df = clean_columns(df)
-        df.dropna(how="all", inplace=True)
+        sheet_bit = store.add_sheet(sheet_name)
+        row_image_map = None
+        row_count = 0
+        non_numeric = []
 
-        if SKU_COLUMN not in df.columns:
-            print(f"  No '{SKU_COLUMN}' column — skipping.")
-            continue
+        for excel_row, values, extra in read_sheet(wb[sheet_name], PASSTHROUGH_UNKNOWN_COLUMNS, non_numeric):
+            row_count += 1
+            if row_image_map is None:
+                row_image_map = map_images_to_rows(temp_dir, sheet_idx)
 
-        row_image_map = map_images_to_rows(temp_dir, sheet_idx)
-        df["excel_row"] = df.index + 2
+            sku = values[SKU_POSITION]
+            record = store.add(sku, values, extra, sheet_bit)
 
-        for _, row in df.iterrows():
-            excel_row = int(row["excel_row"])
-            sku_raw = row[SKU_COLUMN]
+            # Uploaded at write time, and only if the SKU changed
+            if excel_row in row_image_map and PRODUCT_IMAGE_BUCKET:
+                if record.images is None:
+                    record.images = []
+                record.images.append(row_image_map[excel_row])
+
+        print(f"  {row_count} rows processed")
+        if non_numeric:
+            print(f"  {len(non_numeric)} rows skipped — SKU is not a number")
+            if report is not None:
+                report["warnings"].append({
+                    "code": "non_numeric_sku",
+                    "sheet": sheet_name,
+                    "rows": [row for row, _ in non_numeric[:MAX_REPORTED_ROWS]],
+                    "skus": [str(sku) for _, sku in non_numeric[:MAX_REPORTED_ROWS]],
+                    "count": len(non_numeric),
+                    "message": "Rows skipped: products are keyed by a numeric SKU",
+                })
+
+    wb.close()
+    try:
+        return write_products(store, source)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
 
-            if pd.isna(sku_raw):
-                continue
 
-            sku = str(sku_raw).strip()
-            if not sku:
-                continue
+# =========================
+# 💾 DYNAMODB WRITE
+# =========================
+
+def upload_images(uploads):
+    for path, s3_key in uploads:
+        ext = os.path.splitext(path)[1].lower()
+        print(f"  Uploading image: {s3_key}")
+        s3.upload_file(
+            path,
+            PRODUCT_IMAGE_BUCKET,
+            s3_key,
+            ExtraArgs={"ContentType": CONTENT_TYPES.get(ext, "application/octet-stream")},
+        )
+
+
+def claimed_skus(source):
+    """{sku: content_hash} for every SKU the source listed on its last upload."""
+    kwargs = {
+        "KeyConditionExpression": Key(SOURCE_FIELD).eq(source),
+        "ProjectionExpression": "#k, #h",
+        "ExpressionAttributeNames": {"#k": SKU_COLUMN, "#h": HASH_FIELD},
+    }
+    claimed = {}
+    while True:
+        result = claims_table.query(**kwargs)
+        for item in result.get("Items", []):
+            claimed[item[SKU_COLUMN]] = item.get(HASH_FIELD)
+        if "LastEvaluatedKey" not in result:
+            return claimed
+        kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+
+def read_product(tables, sku):
+    return tables.products.get_item(Key={SKU_COLUMN: sku}, ConsistentRead=True).get("Item")
 
-            slug_sku = slugify(sku)
-
-            if sku not in sku_index:
-                record = {}
-                for key, value in row.items():
-                    if key in ("excel_row", "images", "sheet_names"):
-                        continue
-                    record[key] = clean_value(value, key)
-
-                record["sheet_names"] = [sheet_name]
-                record["images"] = []
-                sku_index[sku] = record
-            else:
-                record = sku_index[sku]
-                record.setdefault("sheet_names", [])
-                record.setdefault("images", [])
-                if sheet_name not in record["sheet_names"]:
-                    record["sheet_names"].append(sheet_name)
-
-            # Upload image to S3 if present
-            if excel_row in row_image_map and PRODUCT_IMAGE_BUCKET:
-                source_image = row_image_map[excel_row]
-                ext = os.path.splitext(source_image)[1].lower()
-                image_count = len(record["images"]) + 1
-                filename = (
-                    f"{slug_sku}{ext}"
-                    if image_count == 1
-                    else f"{slug_sku}_{image_count}{ext}"
-                )
-                s3_key = f"{IMAGES_PREFIX}/{filename}"
-
-                print(f"  Uploading image: {s3_key}")
-                s3.upload_file(
-                    source_image,
-                    PRODUCT_IMAGE_BUCKET,
-                    s3_key,
-                    ExtraArgs={"ContentType": CONTENT_TYPES.get(ext, "application/octet-stream")},
-                )
-
-                record["images"].append(
-                    f"https://{PRODUCT_IMAGE_BUCKET}.s3.amazonaws.com/{s3_key}"
-                )
-
-        print(f"  {len(df)} rows processed")
-
-    shutil.rmtree(temp_dir, ignore_errors=True)
-
-    # Write to DynamoDB — strip None values (DynamoDB rejects them)
-    print(f"\nWriting {len(sku_index)} products to DynamoDB table '{PRODUCTS_TABLE}'...")
-    with table.batch_writer() as batch:
-        for product in sku_index.values():
-            item = {k: v for k, v in product.items() if v is not None}
-            batch.put_item(Item=item)
-
-    print(f"Done. Total unique SKUs: {len(sku_index)}")
-    return len(sku_index)
+
+def unchanged_since(current):
+    """Condition that holds only while the item is still the version that was read."""
+    if current is None:
+        return Attr(SKU_COLUMN).not_exists()
+    if REVISION_FIELD not in current:
+        return Attr(SKU_COLUMN).exists() & Attr(REVISION_FIELD).not_exists()
+    return Attr(REVISION_FIELD).eq(current[REVISION_FIELD])
+
+
+def sync_summaries(summaries, current, new):
+    old = summary_items(current) if current else []
+    fresh = summary_items(new) if new else []
+    for sheet in {i[SUMMARY_SORT_KEY] for i in old} - {i[SUMMARY_SORT_KEY] for i in fresh}:
+        summaries.delete_item(Key={SKU_COLUMN: current[SKU_COLUMN], SUMMARY_SORT_KEY: sheet})
+    for item in fresh:
+        if item not in old:
+            summaries.put_item(Item=item)
+
+
+def save(tables, current, new):
+    """
+    Replaces `current` with `new` (deletes it when new is None) only if
+    nobody else has written the SKU since it was read, then brings its
+    summaries in line. Returns False when the write lost that race.
+    """
+    try:
+        if new is None:
+            tables.products.delete_item(
+                Key={SKU_COLUMN: current[SKU_COLUMN]},
+                ConditionExpression=unchanged_since(current),
+            )
+        else:
+            new[REVISION_FIELD] = (current or {}).get(REVISION_FIELD, 0) + 1
+            tables.products.put_item(Item=new, ConditionExpression=unchanged_since(current))
+    except tables.products.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+    if tables.summaries:
+        sync_summaries(tables.summaries, current, new)
+    return True
+
+
+def claim(item, source):
+    """
+    Adds `source` to the SKU's claimants and writes its version if it now
+    outranks the owner. Every write is conditional on the revision read
+    just before, so concurrent uploads re-read and re-decide instead of
+    overwriting each other, and the best-ranked source ends up owning the
+    SKU whatever order the uploads ran in. Returns "written" or "conflict".
+    """
+    tables = thread_tables()
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        current = read_product(tables, item[SKU_COLUMN])
+        claimants = set((current or {}).get(CLAIMED_BY_FIELD) or ()) | {source}
+        owner = (current or {}).get(SOURCE_FIELD)
+
+        if current is None or owner == source or source_rank(source) < source_rank(owner):
+            new = dict(item, **{SOURCE_FIELD: source, CLAIMED_BY_FIELD: claimants})
+            outcome = "written"
+        elif source in current.get(CLAIMED_BY_FIELD, ()):
+            return "conflict"
+        else:
+            print(f"  SKU {item[SKU_COLUMN]} is owned by '{owner}' — keeping it")
+            new = dict(current, **{CLAIMED_BY_FIELD: claimants})
+            outcome = "conflict"
+
+        if save(tables, current, new):
+            return outcome
+    raise RuntimeError(f"SKU {item[SKU_COLUMN]} kept changing while being written")
+
+
+def promote(tables, sku, claimants):
+    """The best-ranked remaining claimant's version of a SKU, or None when nobody else lists it."""
+    live = set(claimants)
+    for other in sorted(claimants, key=source_rank):
+        stored = tables.claims.get_item(
+            Key={SOURCE_FIELD: other, SKU_COLUMN: sku}, ConsistentRead=True
+        ).get("Item")
+        if stored is None:
+            live.discard(other)  # claimed before claims were recorded
+            continue
+        return dict(stored[CLAIM_PRODUCT_FIELD], **{SOURCE_FIELD: other, CLAIMED_BY_FIELD: live})
+    return None
+
+
+def release(sku, source):
+    """
+    Drops `source` from a SKU it no longer lists. If it was the owner, the
+    next-best claimant's version takes over, and the item is only deleted
+    when no other source lists the SKU. Returns "deleted", "promoted" or
+    "released".
+    """
+    tables = thread_tables()
+    for _ in range(MAX_WRITE_ATTEMPTS):
+        current = read_product(tables, sku)
+        if current is None:
+            return "deleted"
+        claimants = set(current.get(CLAIMED_BY_FIELD) or ()) - {source}
+
+        if current.get(SOURCE_FIELD) == source:
+            new = promote(tables, sku, claimants)
+            outcome = "promoted" if new else "deleted"
+        elif source in current.get(CLAIMED_BY_FIELD, ()):
+            new = dict(current, **{CLAIMED_BY_FIELD: claimants})
+            if not claimants:
+                del new[CLAIMED_BY_FIELD]  # DynamoDB rejects empty sets
+            outcome = "released"
+        else:
+            return "released"
+
+        if save(tables, current, new):
+            return outcome
+    raise RuntimeError(f"SKU {sku} kept changing while being pruned")
+
+
+def write_products(store, source):
+    """
+    Writes one source's products. SKUs whose content_hash (fields and image
+    bytes) matches the source's stored claim are skipped without touching
+    the products table or S3. For the rest, images are uploaded, the claim is stored first, so a concurrent prune by a
+    higher-priority source can hand the SKU over to it. Its hash is only
+    recorded once ownership is settled, so an interrupted run redoes the
+    SKU next time. SKUs the source listed last time but not now are
+    released. Items are built from the store one chunk at a time, so the
+    full set of DynamoDB items never exists in memory at once.
+    """
+    previous = claimed_skus(source)
+    stale = previous.keys() - store.rows.keys()
+    outcomes = {"written": 0, "conflict": 0, "unchanged": 0}
+
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as pool:
+        products = store.products()
+        while chunk := list(itertools.islice(products, WRITE_CHUNK_SIZE)):
+            changed, uploads = [], []
+            for item, item_uploads in chunk:
+                item.update(index_attributes(item))
+                item[HASH_FIELD] = content_hash(item, [path for path, _ in item_uploads])
+                if previous.get(item[SKU_COLUMN]) == item[HASH_FIELD]:
+                    outcomes["unchanged"] += 1
+                else:
+                    changed.append(item)
+                    uploads.append(item_uploads)
+
+            # Before any item points at them; the s3 client is thread-safe
+            list(pool.map(upload_images, uploads))
+
+            with claims_table.batch_writer() as batch:
+                for item in changed:
+                    batch.put_item(Item={SOURCE_FIELD: source, SKU_COLUMN: item[SKU_COLUMN], CLAIM_PRODUCT_FIELD: item})
+
+            for outcome in pool.map(lambda item: claim(item, source), changed):
+                outcomes[outcome] += 1
+
+            with claims_table.batch_writer() as batch:
+                for item in changed:
+                    batch.put_item(Item={
+                        SOURCE_FIELD: source,
+                        SKU_COLUMN: item[SKU_COLUMN],
+                        HASH_FIELD: item[HASH_FIELD],
+                        CLAIM_PRODUCT_FIELD: item,
+                    })
+
+        pruned = list(pool.map(lambda sku: release(sku, source), stale))
+
+    with claims_table.batch_writer() as batch:
+        for sku in stale:
+            batch.delete_item(Key={SOURCE_FIELD: source, SKU_COLUMN: sku})
+
+    print(f"\nSource '{source}': {outcomes['written']} written, {outcomes['unchanged']} unchanged, "
+          f"{outcomes['conflict']} owned by a higher-priority source, {len(stale)} pruned "
+          f"({pruned.count('deleted')} deleted, {pruned.count('promoted')} handed to another source)")
+    print(f"Done. Total unique SKUs: {len(store)}")
+    return len(store)
 
 
 # =========================
@@ -286,18 +804,32 @@ def process(excel_path, temp_dir):
 # =========================
 
 def handler(event, context):
+    rejected = []
     for record in event.get("Records", []):
         source_bucket = record["s3"]["bucket"]["name"]
-        source_key = record["s3"]["object"]["key"]
+        source_key = unquote_plus(record["s3"]["object"]["key"])
+        source = source_for_key(source_key)
 
-        print(f"Triggered by s3://{source_bucket}/{source_key}")
+        print(f"Triggered by s3://{source_bucket}/{source_key} (source '{source}')")
 
         excel_path = "/tmp/MasterProductList.xlsx"
         temp_dir = "/tmp/temp_extract"
 
         try:
-            s3.download_file(source_bucket, source_key, excel_path)
-            count = process(excel_path, temp_dir)
+            # Other file types are rejected by preflight without being downloaded
+            if source_key.lower().endswith(".xlsx"):
+                s3.download_file(source_bucket, source_key, excel_path)
+
+            report = preflight(excel_path, source_key)
+            print(json.dumps({"preflight": report}))
+            if not report["ok"]:
+                # Not raised: S3 would retry the invocation on the same bad file
+                print(f"Rejected s3://{source_bucket}/{source_key}")
+                rejected.append(report)
+                continue
+
+            count = process(excel_path, temp_dir, source, report)
+            print(json.dumps({"ingested": {"file": source_key, "skus": count, "warnings": report["warnings"]}}))
             print(f"Successfully ingested {count} SKUs")
         finally:
             # Always clean up /tmp — Lambda reuses execution environments
@@ -307,4 +839,6 @@ def handler(event, context):
                 elif os.path.exists(path):
                     os.remove(path)
 
+    if rejected:
+        return {"statusCode": 422, "body": json.dumps(rejected)}
     return {"statusCode": 200, "body": "OK"}
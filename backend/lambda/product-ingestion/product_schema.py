@@ -0,0 +1,278 @@
+import functools
+import math
+import re
+import sys
+from decimal import Decimal, InvalidOperation
+
+# Shared by the product-ingestion Lambda and python/reconcileProducts.py so a
+# workbook is read the same way by both. No AWS dependencies.
+
+SKU_COLUMN = "sku"
+# GSI partition attribute → source field. Attributes are only written when
+# the source field has a value, so each index stays sparse.
+INDEX_KEYS = {
+    "vendor_key": "vendor",
+    "category_key": "category",
+}
+SHEET_INDEX_KEY = "sheet_key"
+INDEX_SORT_KEY = "sort_key"
+# product-summaries holds one item per (sku, sheet)
+SUMMARY_SORT_KEY = "sheet"
+SUMMARY_FIELDS = ("sku", "item", "price", "vendor")
+# Ownership bookkeeping on products items (see write_products in the Lambda)
+SOURCE_FIELD = "source"
+HASH_FIELD = "content_hash"
+CLAIMED_BY_FIELD = "claimed_by"
+REVISION_FIELD = "revision"
+
+
+# =========================
+# 🔧 HELPERS
+# =========================
+
+def normalize_header(header):
+    return str(header).strip().lower().replace(" ", "_").replace("#", "number")
+
+
+def is_blank(val):
+    return (
+        val is None
+        or (isinstance(val, float) and math.isnan(val))
+        or (isinstance(val, str) and not val.strip())
+    )
+
+
+def to_number(val):
+    """Whole numbers → int, everything else → Decimal (DynamoDB rejects float)."""
+    if isinstance(val, bool):
+        return int(val)
+    if isinstance(val, str):
+        val = val.strip().replace("$", "").replace(",", "")
+    try:
+        num = Decimal(str(val))
+    except InvalidOperation:
+        return None
+    if not num.is_finite():
+        return None
+    return int(num) if num == num.to_integral_value() else num
+
+
+def clean_value(val):
+    """
+    Normalize a cell value to a Python/DynamoDB-safe type.
+    - Blank / NaN → None  (filtered out before DynamoDB write)
+    - Dates and times → ISO string
+    - Numbers → int or Decimal
+    """
+    if is_blank(val):
+        return None
+    if hasattr(val, "isoformat"):
+        return val.isoformat()
+    if isinstance(val, (int, float)):
+        return to_number(val)
+    return val
+
+
+# =========================
+# 📋 PRODUCT SCHEMA
+# =========================
+
+def convert_sku(val):
+    """
+    Numeric cells and plain digit text become int SKUs. Any other text stays
+    the trimmed string, so '00123' keeps its zeros and '1E3' is not 1000.
+    """
+    if is_blank(val):
+        return None
+    if isinstance(val, (int, float)) and not isinstance(val, bool):
+        num = to_number(val)
+        if isinstance(num, int):
+            return num
+    text = str(val).strip()
+    return int(text) if re.fullmatch(r"[1-9][0-9]*", text) else text
+
+
+def convert_text(val):
+    if is_blank(val):
+        return None
+    if hasattr(val, "isoformat"):
+        return val.isoformat()
+    if isinstance(val, float) and val.is_integer():
+        val = int(val)
+    return str(val).strip()
+
+
+def convert_label(val):
+    """Text that repeats across thousands of rows (vendor, category) — one shared string per value."""
+    text = convert_text(val)
+    return sys.intern(text) if text is not None else None
+
+
+@functools.lru_cache(maxsize=4096)
+def shared_number(val):
+    """Prices repeat across a catalog; equal cells share one (immutable) Decimal."""
+    return to_number(val)
+
+
+def convert_number(val):
+    return None if is_blank(val) else shared_number(val)
+
+
+# canonical name → normalized header aliases, converter, required
+PRODUCT_SCHEMA = {
+    "sku":        {"aliases": ("sku_number",), "convert": convert_sku, "required": True},
+    "item":       {"aliases": ("item_name", "product_name"), "convert": convert_text},
+    "dimensions": {"aliases": ("dimension", "size"), "convert": convert_label},
+    "price":      {"aliases": ("unit_price", "cost"), "convert": convert_number},
+    "vendor":     {"aliases": ("store", "retailer"), "convert": convert_label},
+    "category":   {"aliases": (), "convert": convert_label},
+    "notes":      {"aliases": ("note",), "convert": convert_text},
+}
+
+# Legacy columns that are never ingested, even as passthrough
+IGNORED_HEADERS = {"image", "image_local", "images", "sheet_names"}
+
+HEADER_LOOKUP = {
+    header: name
+    for name, spec in PRODUCT_SCHEMA.items()
+    for header in (name, *spec["aliases"])
+}
+REQUIRED_COLUMNS = [name for name, spec in PRODUCT_SCHEMA.items() if spec.get("required")]
+
+# Rows are stored as tuples in this order
+SCHEMA_COLUMNS = tuple(PRODUCT_SCHEMA)
+COLUMN_POSITIONS = {name: pos for pos, name in enumerate(SCHEMA_COLUMNS)}
+REQUIRED_POSITIONS = [COLUMN_POSITIONS[name] for name in REQUIRED_COLUMNS]
+SKU_POSITION = COLUMN_POSITIONS[SKU_COLUMN]
+
+
+def compile_columns(header_row, passthrough_unknown=False):
+    """
+    Maps one sheet's header row onto the schema. Returns
+    (columns, passthrough, missing_required) where columns is a list of
+    (cell index, position in SCHEMA_COLUMNS, converter) — only these cells
+    are ever converted — and passthrough is a list of (cell index, header),
+    empty unless passthrough_unknown is set.
+    """
+    columns, passthrough, seen = [], [], set()
+
+    for idx, header in enumerate(header_row):
+        if is_blank(header):
+            continue
+        normalized = normalize_header(header)
+        name = HEADER_LOOKUP.get(normalized)
+
+        if name is None:
+            if passthrough_unknown and normalized not in IGNORED_HEADERS:
+                passthrough.append((idx, normalized))
+            continue
+        if name in seen:
+            continue  # first matching column wins
+
+        seen.add(name)
+        columns.append((idx, COLUMN_POSITIONS[name], PRODUCT_SCHEMA[name]["convert"]))
+
+    missing = [name for name in REQUIRED_COLUMNS if name not in seen]
+    return columns, passthrough, missing
+
+
+def read_sheet(ws, passthrough_unknown=False, rejected=None):
+    """
+    Yields (excel_row, values, extra) for every row of a worksheet that has
+    all required fields, where values is a tuple in SCHEMA_COLUMNS order and
+    extra is the passthrough dict (or None). Returns nothing if the header
+    lacks a required column.
+
+    The tables key sku as a Number, so rows whose SKU is text (e.g. '00123',
+    'ABC-1') are skipped and appended to `rejected` as (excel_row, sku).
+    """
+    if hasattr(ws, "reset_dimensions"):
+        # Read-only sheets trust the stored <dimension>, which exporters often
+        # get wrong; without this a stale 'A1' reads as an empty sheet.
+        ws.reset_dimensions()
+    rows = ws.iter_rows(values_only=True)
+    header_row = next(rows, None)
+    if header_row is None:
+        return
+
+    columns, passthrough, missing = compile_columns(header_row, passthrough_unknown)
+    if missing:
+        print(f"  Missing required column(s) {missing} — skipping.")
+        return
+
+    for excel_row, row in enumerate(rows, start=2):
+        width = len(row)
+        values = [None] * len(SCHEMA_COLUMNS)
+        for idx, pos, convert in columns:
+            if idx < width:
+                values[pos] = convert(row[idx])
+        if any(values[pos] is None for pos in REQUIRED_POSITIONS):
+            continue
+        if not isinstance(values[SKU_POSITION], int):
+            if rejected is not None:
+                rejected.append((excel_row, values[SKU_POSITION]))
+            continue
+
+        extra = None
+        for idx, header in passthrough:
+            value = clean_value(row[idx]) if idx < width else None
+            if value is not None:
+                extra = extra or {}
+                extra[header] = value
+
+        yield excel_row, tuple(values), extra
+
+
+# =========================
+# 🔎 INDEX + SUMMARY ATTRIBUTES
+# =========================
+
+def index_value(val):
+    """Case/whitespace-insensitive form used for GSI keys, e.g. ' The  Container Store' → 'the container store'."""
+    if val is None:
+        return None
+    key = " ".join(str(val).split()).lower()
+    return key or None
+
+
+def sort_key(product):
+    """Sorted by item name within a GSI partition; sku keeps the key unique."""
+    return f"{index_value(product.get('item')) or ''}#{product[SKU_COLUMN]}"
+
+
+def index_attributes(product):
+    """Sparse vendor/category GSI key attributes for browse queries."""
+    attrs = {}
+    for attr, field in INDEX_KEYS.items():
+        key = index_value(product.get(field))
+        if key:
+            attrs[attr] = key
+
+    if attrs:
+        attrs[INDEX_SORT_KEY] = sort_key(product)
+    return attrs
+
+
+def summary_items(product):
+    """
+    Slim projections served to list views, one per sheet the SKU is listed
+    on, so browse-by-sheet finds it under every sheet. Vendor and category
+    keys go on the first sheet's item only, so those indexes return each
+    SKU once.
+    """
+    base = {k: product[k] for k in SUMMARY_FIELDS if product.get(k) is not None}
+    if product.get("images"):
+        base["thumbnail"] = product["images"][0]
+
+    items = []
+    for sheet in product.get("sheet_names") or []:
+        item = dict(base)
+        item[SUMMARY_SORT_KEY] = sheet
+        item[INDEX_SORT_KEY] = sort_key(product)
+        key = index_value(sheet)
+        if key:
+            item[SHEET_INDEX_KEY] = key
+        if not items:
+            item.update(index_attributes(product))
+        items.append(item)
+    return items
@@ -0,0 +1,246 @@
+import boto3
+import hashlib
+import json
+import os
+import random
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+# ========= CONFIG =========
+PROJECTS_TABLE = os.environ.get("PROJECTS_TABLE", "projects")
+PRODUCTS_TABLE = os.environ.get("PRODUCTS_TABLE", "products")
+ROLLUPS_TABLE = os.environ.get("ROLLUPS_TABLE", "project-rollups")
+SCAN_SEGMENTS = int(os.environ.get("SCAN_SEGMENTS", "4"))
+BATCH_GET_SIZE = 100  # DynamoDB BatchGetItem limit
+MAX_RETRIES = 8
+NO_VENDOR = "Unassigned"
+HASH_FIELD = "body_hash"
+# ==========================
+
+dynamodb = boto3.resource("dynamodb", region_name="us-east-2")
+rollups_table = dynamodb.Table(ROLLUPS_TABLE)
+
+# boto3 resources are not thread-safe, so each scan worker gets its own
+_local = threading.local()
+
+
+def thread_resource():
+    if not hasattr(_local, "dynamodb"):
+        _local.dynamodb = boto3.session.Session().resource("dynamodb", region_name="us-east-2")
+    return _local.dynamodb
+
+
+# =========================
+# 📥 READ
+# =========================
+
+def scan_segment(segment, total_segments):
+    """Scans one segment of the projects table, keeping only what the rollup needs."""
+    table = thread_resource().Table(PROJECTS_TABLE)
+    kwargs = {
+        "Segment": segment,
+        "TotalSegments": total_segments,
+        "ProjectionExpression": "id, #n, owner_id, #s",
+        "ExpressionAttributeNames": {"#n": "name", "#s": "spaces"},
+    }
+
+    projects = []
+    while True:
+        result = table.scan(**kwargs)
+        projects.extend(result.get("Items", []))
+        if "LastEvaluatedKey" not in result:
+            return projects
+        kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+
+def scan_projects(total_segments=SCAN_SEGMENTS):
+    with ThreadPoolExecutor(max_workers=total_segments) as pool:
+        segments = pool.map(
+            lambda segment: scan_segment(segment, total_segments),
+            range(total_segments),
+        )
+        return [project for segment in segments for project in segment]
+
+
+def backoff(attempt):
+    time.sleep(min(0.05 * 2 ** attempt, 2) * random.uniform(0.5, 1))
+
+
+def fetch_catalog(skus):
+    """Returns {sku: product} for the given SKUs using batched reads."""
+    catalog = {}
+    skus = list(skus)
+
+    for start in range(0, len(skus), BATCH_GET_SIZE):
+        request = {
+            PRODUCTS_TABLE: {
+                "Keys": [{"sku": sku} for sku in skus[start:start + BATCH_GET_SIZE]],
+                "ProjectionExpression": "sku, #i, price, vendor, images",
+                "ExpressionAttributeNames": {"#i": "item"},
+            }
+        }
+        attempt = 0
+        while request:
+            result = dynamodb.batch_get_item(RequestItems=request)
+            for product in result["Responses"].get(PRODUCTS_TABLE, []):
+                catalog[product["sku"]] = product
+
+            request = result.get("UnprocessedKeys") or None
+            if request:
+                if attempt == MAX_RETRIES:
+                    raise RuntimeError(f"Gave up reading {len(request[PRODUCTS_TABLE]['Keys'])} products")
+                backoff(attempt)
+                attempt += 1
+
+    return catalog
+
+
+def existing_rollups():
+    """{project_id: body_hash} for every rollup currently stored."""
+    kwargs = {"ProjectionExpression": f"project_id, {HASH_FIELD}"}
+    hashes = {}
+    while True:
+        result = rollups_table.scan(**kwargs)
+        for item in result.get("Items", []):
+            hashes[item["project_id"]] = item.get(HASH_FIELD)
+        if "LastEvaluatedKey" not in result:
+            return hashes
+        kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+
+# =========================
+# 🧮 ROLLUP
+# =========================
+
+def assigned_products(project):
+    for space in project.get("spaces") or []:
+        for measurement in space.get("measurements") or []:
+            for product in measurement.get("products") or []:
+                if product.get("sku") is not None:
+                    yield product
+
+
+def to_number(val):
+    """
+    Project documents may hold numbers as strings; treat anything unparseable
+    as 0. NaN/Infinity parse fine but DynamoDB rejects them, so they count as
+    unparseable too.
+    """
+    if val is None or val == "":
+        return Decimal(0)
+    try:
+        num = Decimal(str(val))
+    except ArithmeticError:
+        return Decimal(0)
+    return num if num.is_finite() else Decimal(0)
+
+
+def body_hash(rollup):
+    """Digest of everything but generated_at, so an unchanged rollup hashes the same every run."""
+    body = {k: v for k, v in rollup.items() if k != "generated_at"}
+    payload = json.dumps(body, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_rollup(project, catalog):
+    """
+    Groups a project's assigned products by vendor. Price, vendor and image
+    come from the current catalog; the copy stored on the project is only
+    used when the SKU is no longer in the catalog.
+    """
+    lines = {}
+    for product in assigned_products(project):
+        sku = product["sku"]
+        line = lines.get(sku)
+        if line is None:
+            current = catalog.get(sku, product)
+            images = current.get("images") or []
+            line = {
+                "sku": sku,
+                "item": current.get("item") or product.get("item"),
+                "vendor": current.get("vendor") or NO_VENDOR,
+                "price": to_number(current.get("price")),
+                "image": images[0] if images else None,
+                "quantity": Decimal(0),
+                "in_catalog": sku in catalog,
+            }
+            lines[sku] = line
+        line["quantity"] += to_number(product.get("quantity"))
+
+    vendors = {}
+    for line in lines.values():
+        line["total"] = line["price"] * line["quantity"]
+        vendor = vendors.setdefault(line["vendor"], {
+            "vendor": line["vendor"],
+            "quantity": Decimal(0),
+            "total": Decimal(0),
+            "products": [],
+        })
+        vendor["quantity"] += line["quantity"]
+        vendor["total"] += line["total"]
+        vendor["products"].append({k: v for k, v in line.items() if v is not None})
+
+    return {
+        "project_id": project["id"],
+        "owner_id": project.get("owner_id"),
+        "name": project.get("name"),
+        "vendors": sorted(vendors.values(), key=lambda v: v["vendor"]),
+        "quantity": sum((v["quantity"] for v in vendors.values()), Decimal(0)),
+        "total": sum((v["total"] for v in vendors.values()), Decimal(0)),
+        "generated_at": int(time.time() * 1000),
+    }
+
+
+# =========================
+# 🔄 CORE PROCESSING
+# =========================
+
+def process(total_segments=SCAN_SEGMENTS):
+    print(f"Scanning '{PROJECTS_TABLE}' with {total_segments} segments...")
+    projects = scan_projects(total_segments)
+
+    skus = {product["sku"] for project in projects for product in assigned_products(project)}
+    print(f"Fetching {len(skus)} SKUs from '{PRODUCTS_TABLE}'...")
+    catalog = fetch_catalog(skus)
+
+    missing = len(skus) - len(catalog)
+    if missing:
+        print(f"  {missing} assigned SKUs are no longer in the catalog")
+
+    # Read before writing so a project created mid-run can't be pruned
+    existing = existing_rollups()
+    stale = existing.keys() - {project["id"] for project in projects}
+
+    written = 0
+    print(f"Writing changed rollups of {len(projects)} projects to '{ROLLUPS_TABLE}'...")
+    with rollups_table.batch_writer() as batch:
+        for project in projects:
+            rollup = {k: v for k, v in build_rollup(project, catalog).items() if v is not None}
+            rollup[HASH_FIELD] = body_hash(rollup)
+            # generated_at therefore records when the rollup last changed
+            if existing.get(project["id"]) == rollup[HASH_FIELD]:
+                continue
+            batch.put_item(Item=rollup)
+            written += 1
+
+        # Projects deleted since the last run
+        for project_id in stale:
+            batch.delete_item(Key={"project_id": project_id})
+
+    print(f"  {written} written, {len(projects) - written} unchanged")
+    if stale:
+        print(f"  Removed {len(stale)} rollups for deleted projects")
+
+    return len(projects)
+
+
+# =========================
+# 🚀 LAMBDA HANDLER
+# =========================
+
+def handler(event, context):
+    count = process(int(event.get("segments", SCAN_SEGMENTS)))
+    print(f"Done. Rolled up {count} projects")
+    return {"statusCode": 200, "body": "OK"}
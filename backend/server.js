@@ -9,6 +9,7 @@ import {
   PutCommand,
   GetCommand,
   ScanCommand,
+  QueryCommand,
   DeleteCommand
 } from "@aws-sdk/lib-dynamodb"
 import { S3Client, PutObjectCommand, DeleteObjectCommand } from '@aws-sdk/client-s3'
@@ -54,6 +55,15 @@ const client = new DynamoDBClient({
 const db = DynamoDBDocumentClient.from(client, { marshallOptions: { removeUndefinedValues: true } })
 const PROJECT_TABLE = "projects"
 const PRODUCTS_TABLE = "products"
+const ROLLUPS_TABLE = "project-rollups"
+const PRODUCT_SUMMARIES_TABLE = "product-summaries"
+
+// Browse filters → sparse GSIs on the summaries table (written by product-ingestion)
+const PRODUCT_INDEXES = {
+  sheet: { index: 'sheet-index', key: 'sheet_key' },
+  vendor: { index: 'vendor-index', key: 'vendor_key' },
+  category: { index: 'category-index', key: 'category_key' },
+}
 
 // =========================
 // 📸 S3 SETUP
@@ -184,6 +194,23 @@ app.delete('/projects/:id', requireAuth, async (req, res) => {
   }
 })
 
+// Precomputed by the project-rollups Lambda; may lag behind recent edits
+app.get('/projects/:id/rollup', requireAuth, async (req, res) => {
+  try {
+    const result = await db.send(new GetCommand({
+      TableName: ROLLUPS_TABLE,
+      Key: { project_id: Number(req.params.id) }
+    }))
+    const rollup = result.Item
+    if (!rollup) return res.status(404).json({ error: 'Rollup not found' })
+    if (rollup.owner_id !== req.user.sub) return res.status(403).json({ error: 'Forbidden' })
+    res.json(rollup)
+  } catch (err) {
+    console.error(err)
+    res.status(500).json({ error: 'Failed to fetch rollup' })
+  }
+})
+
 // =========================
 // 🏠 SPACES
 // =========================
@@ -544,8 +571,26 @@ app.delete('/projects/:projectId/labels/:labelId', requireAuth, async (req, res)
 // 🛍 PRODUCTS MASTER LIST
 // =========================
 
+// Must match index_value() in the product-ingestion Lambda
+function indexValue(value) {
+  return String(value).trim().split(/\s+/).join(' ').toLowerCase()
+}
+
 app.get('/products', async (req, res) => {
   try {
+    const filter = Object.keys(PRODUCT_INDEXES).find(name => req.query[name])
+    if (filter) {
+      const { index, key } = PRODUCT_INDEXES[filter]
+      const result = await db.send(new QueryCommand({
+        TableName: PRODUCT_SUMMARIES_TABLE,
+        IndexName: index,
+        KeyConditionExpression: '#k = :v',
+        ExpressionAttributeNames: { '#k': key },
+        ExpressionAttributeValues: { ':v': indexValue(req.query[filter]) },
+      }))
+      return res.json(result.Items || [])
+    }
+
     const result = await db.send(new ScanCommand({
       TableName: PRODUCTS_TABLE
     }))
@@ -9,6 +9,7 @@ export const API_ROUTES = {
   project: (projectId: number) => `${API_BASE_URL}/projects/${projectId}`,
   createProject: `${API_BASE_URL}/projects`,
   updateProject: (projectId: number) => `${API_BASE_URL}/projects/${projectId}`,
+  projectRollup: (projectId: number) => `${API_BASE_URL}/projects/${projectId}/rollup`,
 
   // ========================
   // 🏠 Spaces (under project)
@@ -0,0 +1,476 @@
+import argparse
+import contextlib
+import hashlib
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+from openpyxl import load_workbook
+
+# Workbooks are read with the product-ingestion Lambda's own schema (aliases,
+# converters, required columns), so both sides agree on what a row means
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "backend", "lambda", "product-ingestion"))
+from product_schema import (
+    CLAIMED_BY_FIELD,
+    HASH_FIELD,
+    HEADER_LOOKUP,
+    INDEX_KEYS,
+    INDEX_SORT_KEY,
+    PRODUCT_SCHEMA,
+    REVISION_FIELD,
+    SCHEMA_COLUMNS,
+    SHEET_INDEX_KEY,
+    SKU_COLUMN,
+    SKU_POSITION,
+    SOURCE_FIELD,
+    SUMMARY_SORT_KEY,
+    index_attributes,
+    normalize_header,
+    read_sheet,
+    summary_items,
+)
+
+# ========= CONFIG =========
+TABLE_NAME = "products"
+SUMMARIES_TABLE = "product-summaries"
+CLAIMS_TABLE = "product-claims"
+REGION = "us-east-2"
+SEGMENTS = 8
+WRITE_WORKERS = 8
+REPAIR_CHUNK_SIZE = 100
+# The only workbook columns ingestion writes. Everything else on a table item
+# (S3 image URLs, GSI keys, passthrough columns) is derived at ingest, so it
+# is not compared.
+COMPARED_FIELDS = set(SCHEMA_COLUMNS)
+# Recomputed from the source on repair, never carried over from the table
+DERIVED_FIELDS = {"sheet_names", HASH_FIELD, SHEET_INDEX_KEY, INDEX_SORT_KEY, *INDEX_KEYS}
+# ==========================
+
+
+# --------------------------
+# Normalization + hashing
+# --------------------------
+
+def sku_key(sku):
+    """Workbook SKUs come back as int/str, table SKUs as Decimal — compare as strings."""
+    if isinstance(sku, (int, float, Decimal)) and Decimal(str(sku)) == int(sku):
+        return str(int(sku))
+    return str(sku).strip()
+
+
+def canonical(val):
+    """JSON-safe canonical form so 12.5 (float), Decimal('12.50') and 12.5 hash alike."""
+    if isinstance(val, bool) or val is None:
+        return val
+    if isinstance(val, (int, float, Decimal)):
+        dec = Decimal(str(val))
+        return str(dec.quantize(1)) if dec == dec.to_integral_value() else str(dec.normalize())
+    if isinstance(val, (list, tuple)):
+        return [canonical(v) for v in val]
+    if isinstance(val, dict):
+        return {k: canonical(v) for k, v in val.items()}
+    return str(val)
+
+
+def record_hash(record):
+    """
+    Digest of the compared fields. sheet_names is compared separately
+    because a workbook only knows a SKU's full sheet list after every sheet
+    has been read.
+    """
+    values = {
+        k: canonical(v)
+        for k, v in record.items()
+        if k in COMPARED_FIELDS and v is not None and v != ""
+    }
+    payload = json.dumps(values, sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).digest()
+
+
+# --------------------------
+# Source (workbook / data.json)
+# --------------------------
+
+def iter_workbook_rows(excel_file):
+    """
+    Yields (sku_key, record, sheet_name) for every SKU row, parsed exactly as
+    the ingestion Lambda parses it. Nothing is accumulated here.
+    """
+    wb = load_workbook(excel_file, read_only=True, data_only=True)
+    try:
+        for sheet_name in wb.sheetnames:
+            for _, values, _ in read_sheet(wb[sheet_name]):
+                record = {k: v for k, v in zip(SCHEMA_COLUMNS, values) if v is not None}
+                yield sku_key(values[SKU_POSITION]), record, sheet_name
+    finally:
+        wb.close()
+
+
+def schema_record(raw):
+    """Maps a data.json record's keys and values through the ingestion schema."""
+    record = {}
+    for key, value in raw.items():
+        name = HEADER_LOOKUP.get(normalize_header(key))
+        if name is None or name in record:
+            continue
+        value = PRODUCT_SCHEMA[name]["convert"](value)
+        if value is not None:
+            record[name] = value
+    return record
+
+
+def iter_json_rows(json_file):
+    with open(json_file, encoding="utf-8") as f:
+        records = json.load(f)
+
+    for raw in records:
+        record = schema_record(raw)
+        # Skipped like read_sheet skips them: the tables key sku as a Number
+        if not isinstance(record.get(SKU_COLUMN), int):
+            continue
+        for sheet_name in raw.get("sheet_names") or [None]:
+            yield sku_key(record[SKU_COLUMN]), record, sheet_name
+
+
+def iter_source(args):
+    if args.excel:
+        return iter_workbook_rows(args.excel)
+    return iter_json_rows(args.json)
+
+
+def index_source(args):
+    """
+    {sku_key: (digest, sheet_names)} — the first row for a SKU defines its
+    fields (as in ingestion), later rows only add sheets. Only digests are
+    held, never full records.
+    """
+    index = {}
+    for key, record, sheet_name in iter_source(args):
+        entry = index.get(key)
+        if entry is None:
+            entry = index[key] = (record_hash(record), [])
+        if sheet_name is not None and sheet_name not in entry[1]:
+            entry[1].append(sheet_name)
+    return index
+
+
+# --------------------------
+# Table scan + compare
+# --------------------------
+
+_local = threading.local()
+
+
+def thread_table(args, name=None):
+    # boto3 resources are not thread-safe, so each scan/repair worker gets its own
+    if not hasattr(_local, "resource"):
+        _local.resource = boto3.session.Session().resource(
+            "dynamodb", region_name=args.region, endpoint_url=args.endpoint_url
+        )
+        _local.tables = {}
+    name = name or args.table
+    if name not in _local.tables:
+        _local.tables[name] = _local.resource.Table(name)
+    return _local.tables[name]
+
+
+def compare_segment(args, segment, source_index):
+    table = thread_table(args)
+    kwargs = {"Segment": segment, "TotalSegments": args.segments}
+    if args.source:
+        kwargs["FilterExpression"] = Attr(SOURCE_FIELD).eq(args.source)
+
+    seen, extra, divergent = [], [], []
+    scanned = 0
+    while True:
+        result = table.scan(**kwargs)
+        for item in result.get("Items", []):
+            scanned += 1
+            key = sku_key(item[SKU_COLUMN])
+            expected = source_index.get(key)
+            if expected is None:
+                extra.append((item[SKU_COLUMN], item.get(REVISION_FIELD)))
+                continue
+            seen.append(key)
+            digest, sheet_names = expected
+            if record_hash(item) != digest or item.get("sheet_names", []) != sheet_names:
+                divergent.append((key, {
+                    k: v for k, v in item.items()
+                    if k not in COMPARED_FIELDS and k not in DERIVED_FIELDS
+                }))
+
+        if "LastEvaluatedKey" not in result:
+            return scanned, seen, extra, divergent
+        kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+
+def reconcile(args, source_index):
+    with ThreadPoolExecutor(max_workers=args.segments) as pool:
+        results = list(pool.map(
+            lambda segment: compare_segment(args, segment, source_index),
+            range(args.segments),
+        ))
+
+    scanned = sum(r[0] for r in results)
+    seen = {key for r in results for key in r[1]}
+    extra = [pair for r in results for pair in r[2]]
+    divergent = dict(pair for r in results for pair in r[3])
+    missing = sorted(set(source_index) - seen)
+
+    return scanned, missing, extra, divergent
+
+
+# --------------------------
+# Repair
+# --------------------------
+
+def summary_sheets(summaries, sku):
+    """Sheets that currently have a summary item for this SKU."""
+    kwargs = {
+        "KeyConditionExpression": "#k = :sku",
+        "ProjectionExpression": "#s",
+        "ExpressionAttributeNames": {"#k": SKU_COLUMN, "#s": SUMMARY_SORT_KEY},
+        "ExpressionAttributeValues": {":sku": sku},
+    }
+    sheets = set()
+    while True:
+        result = summaries.query(**kwargs)
+        sheets.update(item[SUMMARY_SORT_KEY] for item in result.get("Items", []))
+        if "LastEvaluatedKey" not in result:
+            return sheets
+        kwargs["ExclusiveStartKey"] = result["LastEvaluatedKey"]
+
+
+def unchanged_since(revision, exists=True):
+    """
+    Condition that holds only while the item is still the version scanned,
+    the same rule ingestion writes under. exists=False is for SKUs the scan
+    did not see.
+    """
+    if not exists:
+        return Attr(SKU_COLUMN).not_exists()
+    if revision is None:
+        return Attr(SKU_COLUMN).exists() & Attr(REVISION_FIELD).not_exists()
+    return Attr(REVISION_FIELD).eq(revision)
+
+
+def conditional(write, **kwargs):
+    """Runs a put/delete; False when its ConditionExpression failed."""
+    try:
+        write(**kwargs)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] != "ConditionalCheckFailedException":
+            raise
+        return False
+
+
+def repaired_items(args, source_index, divergent, to_put):
+    """
+    Second pass over the source, so full records are only materialized for
+    the SKUs that actually need writing. Yields (sku_key, item, condition).
+    """
+    for key, record, _ in iter_source(args):
+        if key not in to_put:
+            continue
+        to_put.discard(key)
+        item = {k: v for k, v in record.items() if k in COMPARED_FIELDS}
+        item["sheet_names"] = source_index[key][1]
+        item.update(divergent.get(key, {}))
+        item.update(index_attributes(item))
+
+        scanned_revision = item.get(REVISION_FIELD)
+        item[SOURCE_FIELD] = args.source
+        item[CLAIMED_BY_FIELD] = set(item.get(CLAIMED_BY_FIELD) or ()) | {args.source}
+        item[REVISION_FIELD] = (scanned_revision or 0) + 1
+        yield key, item, unchanged_since(scanned_revision, exists=key in divergent)
+
+
+def put_repaired(args, item, condition):
+    """
+    Conditional put of one repaired item. Returns the summary sheets it no
+    longer lists (for the caller to delete), or None if the condition failed.
+    """
+    if not conditional(thread_table(args).put_item, Item=item, ConditionExpression=condition):
+        return None
+    if not args.summaries_table:
+        return set()
+    return summary_sheets(thread_table(args, args.summaries_table), item[SKU_COLUMN]) - set(item["sheet_names"])
+
+
+def delete_extra(args, sku, revision):
+    """
+    Conditional delete of one extra SKU. A SKU another source also lists is
+    left for that source's next ingest to take over. Returns its summary
+    sheets, or None if the condition failed.
+    """
+    condition = unchanged_since(revision) & Attr(SOURCE_FIELD).eq(args.source) & (
+        Attr(CLAIMED_BY_FIELD).not_exists() | Attr(CLAIMED_BY_FIELD).size().eq(1)
+    )
+    if not conditional(thread_table(args).delete_item, Key={SKU_COLUMN: sku}, ConditionExpression=condition):
+        return None
+    if not args.summaries_table:
+        return set()
+    return summary_sheets(thread_table(args, args.summaries_table), sku)
+
+
+def repair(args, source_index, missing, extra, divergent):
+    """
+    divergent is {sku_key: table-only fields to carry over}. GSI keys and
+    summary items are recomputed here, the same way ingestion builds them.
+    content_hash is left unset.
+
+    Repaired items are stamped with --source. Every write is conditional on
+    the revision the scan saw (missing SKUs on not existing at all), so a
+    SKU another source owns or an ingest changed in the meantime is skipped
+    rather than overwritten. The source's stored claim is dropped, so its
+    next ingest rewrites them. Extras are only deleted if no other source
+    also lists them.
+
+    Conditional writes cannot go in a BatchWriteItem, so products writes
+    are one request per SKU, run on --workers threads. The unconditional
+    summary and claim writes they imply are batched on this thread.
+    """
+    dynamodb = boto3.resource("dynamodb", region_name=args.region, endpoint_url=args.endpoint_url)
+    summaries = dynamodb.Table(args.summaries_table) if args.summaries_table else None
+    claims = dynamodb.Table(args.claims_table) if args.claims_table else None
+
+    to_put = set(missing) | set(divergent)
+    written = deleted = skipped = 0
+
+    with contextlib.ExitStack() as stack:
+        summary_batch = stack.enter_context(summaries.batch_writer(
+            overwrite_by_pkeys=[SKU_COLUMN, SUMMARY_SORT_KEY]
+        )) if summaries else None
+        claim_batch = stack.enter_context(claims.batch_writer(
+            overwrite_by_pkeys=[SOURCE_FIELD, SKU_COLUMN]
+        )) if claims else None
+        pool = stack.enter_context(ThreadPoolExecutor(max_workers=args.workers))
+
+        pending = repaired_items(args, source_index, divergent, to_put) if to_put else iter(())
+        while chunk := list(itertools.islice(pending, REPAIR_CHUNK_SIZE)):
+            results = pool.map(lambda entry: put_repaired(args, entry[1], entry[2]), chunk)
+            for (key, item, _), stale_sheets in zip(chunk, results):
+                if stale_sheets is None:
+                    print(f"  SKU {key} is owned by another source or changed since the scan — skipping")
+                    skipped += 1
+                    continue
+                written += 1
+
+                if claim_batch:
+                    claim_batch.delete_item(Key={SOURCE_FIELD: args.source, SKU_COLUMN: item[SKU_COLUMN]})
+                if summary_batch:
+                    for sheet in stale_sheets:
+                        summary_batch.delete_item(Key={SKU_COLUMN: item[SKU_COLUMN], SUMMARY_SORT_KEY: sheet})
+                    for summary in summary_items(item):
+                        summary_batch.put_item(Item=summary)
+
+        if args.delete_extra:
+            results = pool.map(lambda pair: delete_extra(args, *pair), extra)
+            for (sku, _), sheets in zip(extra, results):
+                if sheets is None:
+                    print(f"  SKU {sku_key(sku)} is also listed by another source or changed — not deleted")
+                    skipped += 1
+                    continue
+                deleted += 1
+
+                if claim_batch:
+                    claim_batch.delete_item(Key={SOURCE_FIELD: args.source, SKU_COLUMN: sku})
+                if summary_batch:
+                    for sheet in sheets:
+                        summary_batch.delete_item(Key={SKU_COLUMN: sku, SUMMARY_SORT_KEY: sheet})
+
+    return written, deleted, skipped
+
+
+# --------------------------
+# MAIN PROCESS
+# --------------------------
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Compare the products table against a workbook or data.json."
+    )
+    files = parser.add_mutually_exclusive_group(required=True)
+    files.add_argument("--excel", help="Workbook to compare against (e.g. MasterProductList.xlsx)")
+    files.add_argument("--json", help="data.json produced by masterProductListToJson.py")
+    parser.add_argument("--source",
+                        help="Ingestion source the file belongs to (e.g. vendors/ikea); only its items are "
+                             "compared. Required for --repair")
+    parser.add_argument("--table", default=TABLE_NAME)
+    parser.add_argument("--summaries-table", default=SUMMARIES_TABLE,
+                        help="Summary table kept in step on repair; pass '' to skip it")
+    parser.add_argument("--claims-table", default=CLAIMS_TABLE,
+                        help="Ingestion claims table, updated on repair")
+    parser.add_argument("--region", default=REGION)
+    parser.add_argument("--endpoint-url", help="e.g. http://localhost:8000 for DynamoDB Local")
+    parser.add_argument("--segments", type=int, default=SEGMENTS, help="Parallel scan segments")
+    parser.add_argument("--workers", type=int, default=WRITE_WORKERS,
+                        help="Parallel conditional writes during repair")
+    parser.add_argument("--repair", action="store_true",
+                        help="Write missing and divergent SKUs from the source")
+    parser.add_argument("--delete-extra", action="store_true",
+                        help="With --repair and --source, also delete that source's SKUs that are not in the file")
+    parser.add_argument("--report", help="Write the full report as JSON to this path")
+    args = parser.parse_args()
+    if (args.repair or args.delete_extra) and not args.source:
+        # Repaired items need an owner, and without a source every other
+        # source's SKUs would count as extra
+        parser.error("--repair and --delete-extra require --source")
+    return args
+
+
+def process():
+    args = parse_args()
+    started = time.time()
+
+    print("Hashing source records...")
+    source_index = index_source(args)
+    print(f"  ✔ {len(source_index)} SKUs in source")
+
+    print(f"\nScanning '{args.table}' with {args.segments} segments...")
+    scanned, missing, extra, divergent = reconcile(args, source_index)
+    print(f"  ✔ {scanned} items scanned")
+
+    print("\n==============================")
+    print(f"Missing (in source, not in table): {len(missing)}")
+    print(f"Extra   (in table, not in source): {len(extra)}")
+    print(f"Divergent:                         {len(divergent)}")
+    print("==============================")
+
+    report = {
+        "table": args.table,
+        "file": args.excel or args.json,
+        "source": args.source,
+        "missing": missing,
+        "extra": [sku_key(sku) for sku, _ in extra],
+        "divergent": sorted(divergent),
+    }
+
+    if args.repair:
+        print("\nRepairing...")
+        written, deleted, skipped = repair(args, source_index, missing, extra, divergent)
+        report["written"] = written
+        report["deleted"] = deleted
+        report["skipped"] = skipped
+        print(f"  ✔ {written} written, {deleted} deleted, {skipped} left to another source")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+
+    print(f"\nDONE in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    process()